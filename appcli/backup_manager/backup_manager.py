@@ -294,12 +294,9 @@ class BackupConfig(DataClassExtensions):
         # Since we're using this format in the filename of the backup, the backup filename
         # will include the ':' character.
         # Tools like `tar` (by default) expects files with ':' in the name to be a remote
-        # resouces. To avoid this issue, we remove all ':'.
-        now: str = (
-            datetime.datetime.now(datetime.timezone.utc)
-            .replace(microsecond=0)
-            .isoformat()
-            .replace(":", "")
+        # resouces. To avoid this issue, we format the ISO datetime without any ':'.
+        now: str = datetime.datetime.now(datetime.timezone.utc).strftime(
+            "%Y-%m-%dT%H%M%S%z"
         )
         return f"{app_name_slug.upper()}_{backup_name.upper()}_{now}.tgz"
 
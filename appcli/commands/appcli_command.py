@@ -12,6 +12,9 @@ not.
 For any appcli command that requires the configuration directory to be in
 specific state to run, update this enum if the command is added, deleted, or
 modified.
+
+The enum is an `IntEnum` so that members hash and compare as plain ints when
+used as keys in the command lookup tables of the configuration states.
 ________________________________________________________________________________
 
 Created by brightSPARK Labs
@@ -19,10 +22,10 @@ www.brightsparklabs.com
 """
 
 # standard libraries
-from enum import Enum, auto
+from enum import IntEnum, auto
 
 
-class AppcliCommand(Enum):
+class AppcliCommand(IntEnum):
     CONFIGURE_INIT = auto()
     CONFIGURE_APPLY = auto()
     CONFIGURE_GET = auto()
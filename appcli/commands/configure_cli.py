@@ -117,17 +117,15 @@ class ConfigureCli:
             logger.debug("Running pre-configure apply hook")
             hooks.pre_configure_apply(ctx)
 
+            configuration = ConfigurationManager(cli_context, self.cli_configuration)
+
             # Validate the configuration schema.
             logger.debug("Validating configuration files")
-            ConfigurationManager(
-                cli_context, self.cli_configuration
-            ).validate_configuration()
+            configuration.validate_configuration()
 
             # Apply changes
             logger.debug("Applying configuration")
-            ConfigurationManager(
-                cli_context, self.cli_configuration
-            ).apply_configuration_changes(message)
+            configuration.apply_configuration_changes(message)
 
             # Run post-hooks
             logger.debug("Running post-configure apply hook")
@@ -10,9 +10,15 @@ www.brightsparklabs.com
 """
 
 # standard libraries
-from collections import defaultdict
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable
+from types import MappingProxyType
+from typing import ClassVar, Iterable, Mapping, Optional, Tuple
 
 # vendor libraries
 import git
@@ -26,6 +32,105 @@ from appcli.git_repositories.git_repositories import (
 )
 from appcli.logger import logger
 
+# ------------------------------------------------------------------------------
+# CONSTANTS
+# ------------------------------------------------------------------------------
+
+NO_CONFIGURATION_DIR_ERROR_MESSAGE = (
+    "No configuration directory provided to appcli. Run 'install'."
+)
+""" Error for commands run before appcli knows the configuration directory. """
+
+UNINITIALISED_ERROR_MESSAGE = (
+    "Cannot run command against uninitialised application. Run 'configure init'."
+)
+""" Error for commands run before the configuration directory is initialised. """
+
+EXISTING_CONFIGURATION_ERROR_MESSAGE = "Cannot initialise an existing configuration."
+""" Error for initialising a configuration directory which is already initialised. """
+
+REQUIRES_MIGRATION_ERROR_MESSAGE = "Application requires migration. Configuration version [{conf_version}], Application version [{app_version}]."
+""" Error template for commands run when the configuration and application versions differ. """
+
+INVALID_ERROR_MESSAGE = "Invalid configuration state, this error must be rectified before continuing. {error}"
+""" Error template for commands run when the configuration directory is invalid. """
+
+ALL_COMMANDS = tuple(AppcliCommand)
+""" All appcli commands, built once as the template for the disallowed command tables. """
+
+STATE_CACHE_FILE_NAME = "configuration-state-cache.json"
+""" Name of the file caching the derived state (relative to the configuration metadata directory). """
+
+STATE_CACHE_RACY_WINDOW_NS = 2_000_000_000
+""" Files modified within this many nanoseconds are considered too recent to fingerprint for the state cache. """
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+
+def get_disallowed_command_from_allowed_commands(
+    allowed_commands: Iterable[AppcliCommand], error_message: str
+) -> dict:
+    """Given an Iterable of allowed appcli commands, generates the dict of disallowed commands.
+
+    Args:
+        allowed_commands (Iterable[AppcliCommand]): Allowed commands.
+        error_message (str): Error message for disallowed commands.
+
+    Returns:
+        dict: [description]
+    """
+    allowed_commands = frozenset(allowed_commands)
+    return {
+        command: error_message
+        for command in ALL_COMMANDS
+        if command not in allowed_commands
+    }
+
+
+def read_only(mapping: Mapping) -> MappingProxyType:
+    """Gets a read-only view of a mapping.
+
+    Args:
+        mapping (Mapping): The mapping.
+
+    Returns:
+        MappingProxyType: The mapping itself if it is already a read-only view, otherwise a read-only view of it.
+    """
+    if isinstance(mapping, MappingProxyType):
+        return mapping
+    return MappingProxyType(mapping)
+
+
+def build_command_table(
+    disallowed_command: Mapping[AppcliCommand, str],
+    disallowed_command_unless_forced: Mapping[AppcliCommand, str],
+) -> tuple:
+    """Merges the disallowed and disallowed-unless-forced commands into a single lookup table, so that checking a
+    command only requires one lookup. As `AppcliCommand` is an `IntEnum`, the table is a tuple indexed by command.
+
+    Args:
+        disallowed_command (Mapping[AppcliCommand, str]): Commands which are disallowed, mapped to their error message.
+        disallowed_command_unless_forced (Mapping[AppcliCommand, str]): Commands which are disallowed unless forced,
+            mapped to their error message.
+
+    Returns:
+        tuple: For each command, either None if the command is allowed, or a tuple of (whether forcing allows the
+            command, the error message).
+    """
+    command_table = [None] * (max(ALL_COMMANDS) + 1)
+    for command, message in disallowed_command_unless_forced.items():
+        command_table[command] = (
+            True,
+            f"{message} If this command supports it, use '--force' to ignore error.",
+        )
+    # Outright disallowed commands take precedence over those which can be forced.
+    for command, message in disallowed_command.items():
+        command_table[command] = (False, message)
+    return tuple(command_table)
+
+
 # ------------------------------------------------------------------------------
 # CLASSES
 # ------------------------------------------------------------------------------
@@ -36,74 +141,329 @@ class ConfigurationDirState:
     directories.
 
     This is the base class from which all the different 'state' classes of the configuration directory will inherit.
+    The disallowed commands of each state are fixed, so they are declared as class attributes shared by all instances
+    rather than being rebuilt on every construction.
     """
 
-    def __init__(self, disallowed_command, disallowed_command_unless_forced) -> None:
-        self.disallowed_command = disallowed_command
-        self.disallowed_command_unless_forced = disallowed_command_unless_forced
+    __slots__ = ()
+
+    disallowed_command: ClassVar[Mapping[AppcliCommand, str]] = MappingProxyType({})
+    """ Commands which cannot be run in this state, mapped to the error message to display. """
+
+    disallowed_command_unless_forced: ClassVar[Mapping[AppcliCommand, str]] = (
+        MappingProxyType({})
+    )
+    """ Commands which cannot be run in this state unless forced, mapped to the error message to display. """
+
+    command_table: ClassVar[Tuple[Optional[Tuple[bool, str]], ...]] = (
+        build_command_table({}, {})
+    )
+    """ Both of the above merged into one lookup table. See `build_command_table`. """
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # Subclasses which hold their tables per instance build them in their constructor.
+        if isinstance(cls.disallowed_command, Mapping):
+            # The tables are shared by every instance, so expose them read-only.
+            cls.disallowed_command = read_only(cls.disallowed_command)
+            cls.disallowed_command_unless_forced = read_only(
+                cls.disallowed_command_unless_forced
+            )
+            cls.command_table = build_command_table(
+                cls.disallowed_command, cls.disallowed_command_unless_forced
+            )
 
     def verify_command_allowed(self, command: AppcliCommand, force: bool = False):
-        if command in self.disallowed_command:
-            error_and_exit(self.disallowed_command[command])
-        if command in self.disallowed_command_unless_forced and not force:
-            error_and_exit(
-                f"{self.disallowed_command_unless_forced[command]}"
-                " If this command supports it, use '--force' to ignore error."
-            )
+        error_message = self._get_error_message(command, force)
+        if error_message is not None:
+            error_and_exit(error_message)
+        # Use lazy formatting so the message is only built when debug logging is enabled.
         logger.debug(
-            f"Allowed command [{command}] with current configuration state [{self.__class__.__name__}], where force is [{force}]."
+            "Allowed command [%s] with current configuration state [%s], where force is [%s].",
+            command.name,
+            self.__class__.__name__,
+            force,
         )
 
+    def _get_error_message(self, command: AppcliCommand, force: bool) -> Optional[str]:
+        """Gets the error message for a command which is not allowed to run in this state.
+
+        Args:
+            command (AppcliCommand): The command to check.
+            force (bool): Whether the command is being forced.
+
+        Returns:
+            Optional[str]: The error message if the command is not allowed, otherwise None.
+        """
+        entry = self.command_table[command]
+        if entry is None:
+            return None
+        allowed_if_forced, error_message = entry
+        if allowed_if_forced and force:
+            return None
+        return error_message
+
 
 class ConfigurationDirStateFactory:
     """Factory class to get the current ConfigurationDirState state class"""
 
+    @staticmethod
     def get_state(
         configuration_dir: Path,
         generated_configuration_dir: Path,
         app_version: str,
         backup_dir: Path,
+        metadata_dir: Optional[Path] = None,
     ) -> ConfigurationDirState:
+        """Gets the state of the configuration directory.
+
+        Args:
+            configuration_dir (Path): Path to the configuration directory.
+            generated_configuration_dir (Path): Path to the generated configuration directory.
+            app_version (str): The version of the application.
+            backup_dir (Path): Path to the backup directory.
+            metadata_dir (Optional[Path]): Optional (defaults to None). Path to the configuration metadata directory,
+                in which the derived state is cached. If None, the state is not cached.
+
+        Returns:
+            ConfigurationDirState: The state of the configuration directory.
+        """
         if configuration_dir is None:
-            return NoDirectoryProvidedConfigurationDirState()
+            return NO_DIRECTORY_PROVIDED_CONFIGURATION_DIR_STATE
 
         if backup_dir is None:
-            return NoDirectoryProvidedBackupDirState()
+            return NO_DIRECTORY_PROVIDED_BACKUP_DIR_STATE
 
         if not backup_dir.exists():
-            return BackupDirectoryDoesNotExist()
+            return BACKUP_DIRECTORY_DOES_NOT_EXIST_STATE
 
+        # Probe for both repositories up front, before any git operations are
+        # run, so the (more expensive) repository handles are only opened once
+        # we know they will be needed.
         if not ConfigurationDirStateFactory.__is_git_repo(configuration_dir):
-            return UninitialisedConfigurationDirState()
+            return UNINITIALISED_CONFIGURATION_DIR_STATE
+        is_generated_repo = ConfigurationDirStateFactory.__is_git_repo(
+            generated_configuration_dir
+        )
+
+        # The remaining checks all run git commands, so re-use the previously derived state if nothing on disk has
+        # changed since it was derived.
+        fingerprint = None
+        if metadata_dir is not None:
+            cache_file = metadata_dir.joinpath(STATE_CACHE_FILE_NAME)
+            unfingerprinted_prefixes = tuple(
+                d.name
+                for d in (generated_configuration_dir, metadata_dir)
+                if d is not None
+            )
+            fingerprint = ConfigurationDirStateFactory.__get_fingerprint(
+                app_version,
+                configuration_dir,
+                generated_configuration_dir if is_generated_repo else None,
+                unfingerprinted_prefixes,
+            )
+        if fingerprint is not None:
+            cached_state = ConfigurationDirStateFactory.__read_cached_state(
+                cache_file, fingerprint
+            )
+            if cached_state is not None:
+                logger.debug("Using cached configuration state from [%s]", cache_file)
+                return cached_state
+
+        state = ConfigurationDirStateFactory.__get_git_state(
+            configuration_dir,
+            generated_configuration_dir if is_generated_repo else None,
+            app_version,
+        )
+        if fingerprint is not None:
+            ConfigurationDirStateFactory.__write_cached_state(
+                cache_file, fingerprint, state
+            )
+        return state
 
+    @staticmethod
+    def __get_git_state(
+        configuration_dir: Path,
+        generated_configuration_dir: Optional[Path],
+        app_version: str,
+    ) -> ConfigurationDirState:
+        """Derives the state of the configuration directory from its git repositories.
+
+        Args:
+            configuration_dir (Path): Path to the configuration git repository.
+            generated_configuration_dir (Optional[Path]): Path to the generated configuration git repository, or None
+                if it is not a git repository.
+            app_version (str): The version of the application.
+
+        Returns:
+            ConfigurationDirState: The state of the configuration directory.
+        """
         config_repo = ConfigurationGitRepository(configuration_dir)
 
         conf_version = config_repo.get_repository_version()
         if conf_version != app_version:
-            error_message = f"Application requires migration. Configuration version [{conf_version}], Application version [{app_version}]."
-            return RequiresMigrationConfigurationDirState(error_message)
+            return ConfigurationDirStateFactory.__get_error_state(
+                RequiresMigrationConfigurationDirState,
+                REQUIRES_MIGRATION_ERROR_MESSAGE.format(
+                    conf_version=conf_version, app_version=app_version
+                ),
+            )
 
-        if not ConfigurationDirStateFactory.__is_git_repo(generated_configuration_dir):
-            return UnappliedConfigurationDirState()
+        if generated_configuration_dir is None:
+            return UNAPPLIED_CONFIGURATION_DIR_STATE
         gen_config_repo = GeneratedConfigurationGitRepository(
             generated_configuration_dir
         )
 
-        if config_repo.is_dirty():
-            if gen_config_repo.is_dirty():
-                return DirtyConfAndGenConfigurationDirState()
-            return DirtyConfConfigurationDirState()
+        # Each dirty check runs git subprocesses, so check both repositories concurrently.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            is_config_repo_dirty = executor.submit(config_repo.is_dirty)
+            is_gen_config_repo_dirty = executor.submit(gen_config_repo.is_dirty)
+            dirty_state = DIRTY_STATES.get(
+                (is_config_repo_dirty.result(), is_gen_config_repo_dirty.result())
+            )
+        if dirty_state is not None:
+            return dirty_state
+
+        if gen_config_repo.has_multiple_commits():
+            return ConfigurationDirStateFactory.__get_error_state(
+                InvalidConfigurationDirState,
+                f"Generated repository [{gen_config_repo.get_repo_path()}] has extra untracked git commits.",
+            )
+
+        return CLEAN_CONFIGURATION_DIR_STATE
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def __get_error_state(state_class: type, error: str) -> ConfigurationDirState:
+        """Gets the state constructed from an error message. States are immutable, so instances are shared between
+        calls with the same error message.
+
+        Args:
+            state_class (type): The state class to construct.
+            error (str): The error message to construct the state with.
+
+        Returns:
+            ConfigurationDirState: The state.
+        """
+        return state_class(error)
+
+    @staticmethod
+    def __get_fingerprint(
+        app_version: str,
+        configuration_dir: Path,
+        generated_configuration_dir: Optional[Path],
+        unfingerprinted_prefixes: Tuple[str, ...],
+    ) -> Optional[str]:
+        """Fingerprints everything the derived state depends on: the application version, and the path, size,
+        modification and change times, inode and device of every file in the repositories (including their git
+        metadata, other than the object store). Any change to the working trees, index or refs changes the
+        fingerprint.
+
+        As with git's 'racy' index entries, a file modified very recently could be modified again without its stat
+        data changing, so no fingerprint is produced if any file was modified or changed within
+        `STATE_CACHE_RACY_WINDOW_NS` of now. The change time is checked too, as the modification time can be
+        restored (e.g. `cp -p`, `touch -r`).
+
+        Args:
+            app_version (str): The version of the application.
+            configuration_dir (Path): Path to the configuration git repository.
+            generated_configuration_dir (Optional[Path]): Path to the generated configuration git repository, or None
+                if it is not a git repository.
+            unfingerprinted_prefixes (Tuple[str, ...]): Prefixes of the top-level configuration directory entries
+                which are not part of the fingerprint.
 
-        if gen_config_repo.is_dirty():
-            return DirtyGenConfigurationDirState()
+        Returns:
+            Optional[str]: The fingerprint, or None if the repositories were modified too recently to be fingerprinted.
+        """
+        racy_after_ns = time.time_ns() - STATE_CACHE_RACY_WINDOW_NS
+        digest = hashlib.sha1(app_version.encode())
+        for repo_dir in (configuration_dir, generated_configuration_dir):
+            digest.update(f"\0{repo_dir}".encode())
+            if repo_dir is None:
+                continue
+            for root, dirs, files in os.walk(repo_dir):
+                if root == str(repo_dir):
+                    # The generated directory is fingerprinted separately, and the metadata directory holds the cache.
+                    dirs[:] = [
+                        d for d in dirs if not d.startswith(unfingerprinted_prefixes)
+                    ]
+                elif os.path.basename(root) == ".git" and "objects" in dirs:
+                    # Objects are immutable, any new objects are accompanied by changes to the index or refs.
+                    dirs.remove("objects")
+                dirs.sort()
+                for file in sorted(files):
+                    path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if max(stat.st_mtime_ns, stat.st_ctime_ns) >= racy_after_ns:
+                        return None
+                    # Like git's index stat data, include the ctime, inode and device so that an edit which keeps
+                    # the size and restores the mtime (e.g. `cp -p`, `rsync -a`, `touch -r`) is still detected.
+                    digest.update(
+                        f"\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0{stat.st_ctime_ns}"
+                        f"\0{stat.st_ino}\0{stat.st_dev}".encode()
+                    )
+        return digest.hexdigest()
+
+    @staticmethod
+    def __read_cached_state(
+        cache_file: Path, fingerprint: str
+    ) -> Optional[ConfigurationDirState]:
+        """Reads the cached state, if the cache was written for the supplied fingerprint.
+
+        Args:
+            cache_file (Path): Path to the cache file.
+            fingerprint (str): Fingerprint of the current configuration directory.
 
-        if gen_config_repo.get_commit_count() > 1:
-            return InvalidConfigurationDirState(
-                f"Generated repository [{gen_config_repo.get_repo_path()}] has extra untracked git commits."
+        Returns:
+            Optional[ConfigurationDirState]: The cached state, or None if there is no valid cached state.
+        """
+        try:
+            cache = json.loads(cache_file.read_text())
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(cache, dict) or cache.get("fingerprint") != fingerprint:
+            return None
+
+        state_name = cache.get("state")
+        if state_name in SHARED_STATES:
+            return SHARED_STATES[state_name]
+        if state_name in ERROR_STATES and isinstance(cache.get("error"), str):
+            return ConfigurationDirStateFactory.__get_error_state(
+                ERROR_STATES[state_name], cache["error"]
             )
+        return None
 
-        return CleanConfigurationDirState()
+    @staticmethod
+    def __write_cached_state(
+        cache_file: Path, fingerprint: str, state: ConfigurationDirState
+    ):
+        """Writes the state to the cache. Failing to write the cache is not an error, the state is just re-derived
+        next time.
 
+        Args:
+            cache_file (Path): Path to the cache file.
+            fingerprint (str): Fingerprint of the configuration directory the state was derived from.
+            state (ConfigurationDirState): The derived state.
+        """
+        cache = {
+            "fingerprint": fingerprint,
+            "state": state.__class__.__name__,
+            "error": getattr(state, "error", None),
+        }
+        try:
+            cache_file.parent.mkdir(exist_ok=True)
+            temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            temp_file.write_text(json.dumps(cache))
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            logger.debug("Could not write configuration state cache: %s", e)
+
+    @staticmethod
     def __is_git_repo(path: Path):
         """Checks if the directory at the path is a git repository.
 
@@ -113,6 +473,15 @@ class ConfigurationDirStateFactory:
         Returns:
             bool: True if the directory exists and is a git repo. Otherwise False.
         """
+        if path is None or not path.is_dir():
+            return False
+
+        # Cheap filesystem check first to avoid the cost of constructing a full
+        # `git.Repo` in the common case. Anything else (e.g. an empty `.git`
+        # directory) is left to `git.Repo` to decide.
+        if path.joinpath(".git", "HEAD").is_file():
+            return True
+
         try:
             # If this doesn't raise an Exception, a git repo exists at this path.
             git.Repo(path)
@@ -124,199 +493,226 @@ class ConfigurationDirStateFactory:
 class NoDirectoryProvidedConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where appcli doesn't know the path to configuration dir."""
 
-    def __init__(self) -> None:
-        default_error_message = (
-            "No configuration directory provided to appcli. Run 'install'."
-        )
-
-        disallowed_command = get_disallowed_command_from_allowed_commands(
-            [AppcliCommand.INSTALL],
-            default_error_message,
-        )
-        disallowed_command_unless_forced = {}
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = get_disallowed_command_from_allowed_commands(
+        [AppcliCommand.INSTALL],
+        NO_CONFIGURATION_DIR_ERROR_MESSAGE,
+    )
 
 
 class NoDirectoryProvidedBackupDirState(ConfigurationDirState):
     """Represents the backup dir state where appcli doesn't know the path to backup dir."""
 
-    def __init__(self) -> None:
-        disallowed_command = {
-            AppcliCommand.BACKUP: "Cannot backup due to missing backup directory. Run 'install'.",
-            AppcliCommand.RESTORE: "Cannot restore due to missing backup directory. Run 'install'.",
-            AppcliCommand.VIEW_BACKUPS: "Cannot view backups due to missing backup directory. Run 'install'.",
-        }
-        disallowed_command_unless_forced = {}
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = {
+        AppcliCommand.BACKUP: "Cannot backup due to missing backup directory. Run 'install'.",
+        AppcliCommand.RESTORE: "Cannot restore due to missing backup directory. Run 'install'.",
+        AppcliCommand.VIEW_BACKUPS: "Cannot view backups due to missing backup directory. Run 'install'.",
+    }
 
 
 class BackupDirectoryDoesNotExist(ConfigurationDirState):
     """Represents the backup dir state where the backup directory does not exist."""
 
-    def __init__(self) -> None:
-        disallowed_command = {
-            AppcliCommand.RESTORE: "Cannot restore due to missing backup directory. Run 'backup'.",
-            AppcliCommand.VIEW_BACKUPS: "Cannot view backups due to missing backup directory. Run 'backup'.",
-        }
-        disallowed_command_unless_forced = {}
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = {
+        AppcliCommand.RESTORE: "Cannot restore due to missing backup directory. Run 'backup'.",
+        AppcliCommand.VIEW_BACKUPS: "Cannot view backups due to missing backup directory. Run 'backup'.",
+    }
 
 
 class UninitialisedConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where config directory hasn't been initialised."""
 
-    def __init__(self) -> None:
-        default_error_message = "Cannot run command against uninitialised application. Run 'configure init'."
-
-        disallowed_command = get_disallowed_command_from_allowed_commands(
-            [
-                AppcliCommand.CONFIGURE_INIT,
-                AppcliCommand.LAUNCHER,
-                AppcliCommand.BACKUP,
-                AppcliCommand.RESTORE,
-                AppcliCommand.VIEW_BACKUPS,
-            ],
-            default_error_message,
-        )
-        disallowed_command_unless_forced = {}
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = get_disallowed_command_from_allowed_commands(
+        [
+            AppcliCommand.CONFIGURE_INIT,
+            AppcliCommand.LAUNCHER,
+            AppcliCommand.BACKUP,
+            AppcliCommand.RESTORE,
+            AppcliCommand.VIEW_BACKUPS,
+        ],
+        UNINITIALISED_ERROR_MESSAGE,
+    )
 
 
 class UnappliedConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where configuration hasn't been applied yet, i.e. the generated
     configuration doesn't exist."""
 
-    def __init__(self) -> None:
-        disallowed_command = {
-            AppcliCommand.CONFIGURE_INIT: "Cannot initialise an existing configuration.",
-            AppcliCommand.SERVICE_START: "Cannot start services due to missing generated configuration. Run 'configure apply'.",
-            AppcliCommand.SERVICE_SHUTDOWN: "Cannot stop services due to missing generated configuration. Run 'configure apply'.",
-            AppcliCommand.SERVICE_LOGS: "Cannot get service logs due to missing generated configuration. Run 'configure apply'.",
-            AppcliCommand.SERVICE_STATUS: "Cannot get the status of services due to missing generated configuration. Run 'configure apply'.",
-            AppcliCommand.TASK_RUN: "Cannot run tasks due to missing generated configuration. Run 'configure apply'.",
-            AppcliCommand.ORCHESTRATOR: "Cannot run orchestrator commands due to missing generated configuration. Run 'configure apply'.",
-        }
-        disallowed_command_unless_forced = {}
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = {
+        AppcliCommand.CONFIGURE_INIT: EXISTING_CONFIGURATION_ERROR_MESSAGE,
+        AppcliCommand.SERVICE_START: "Cannot start services due to missing generated configuration. Run 'configure apply'.",
+        AppcliCommand.SERVICE_SHUTDOWN: "Cannot stop services due to missing generated configuration. Run 'configure apply'.",
+        AppcliCommand.SERVICE_LOGS: "Cannot get service logs due to missing generated configuration. Run 'configure apply'.",
+        AppcliCommand.SERVICE_STATUS: "Cannot get the status of services due to missing generated configuration. Run 'configure apply'.",
+        AppcliCommand.TASK_RUN: "Cannot run tasks due to missing generated configuration. Run 'configure apply'.",
+        AppcliCommand.ORCHESTRATOR: "Cannot run orchestrator commands due to missing generated configuration. Run 'configure apply'.",
+    }
 
 
 class CleanConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where config and generated directories both exist and are in a clean
     state."""
 
-    def __init__(self) -> None:
-        disallowed_command = {
-            AppcliCommand.CONFIGURE_INIT: "Cannot initialise an existing configuration.",
-        }
-        disallowed_command_unless_forced = {}
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = {
+        AppcliCommand.CONFIGURE_INIT: EXISTING_CONFIGURATION_ERROR_MESSAGE,
+    }
 
 
 class DirtyConfConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where config directory is dirty."""
 
-    def __init__(self) -> None:
-        disallowed_command = {
-            AppcliCommand.CONFIGURE_INIT: "Cannot initialise an existing configuration.",
-            AppcliCommand.MIGRATE: "Cannot migrate with a dirty configuration. Run 'configure apply'.",
-        }
-        disallowed_command_unless_forced = {
-            AppcliCommand.SERVICE_START: "Cannot start with dirty configuration. Run 'configure apply'.",
-            AppcliCommand.TASK_RUN: "Cannot run task with dirty configuration. Run 'configure apply'.",
-            AppcliCommand.ORCHESTRATOR: "Cannot run orchestrator tasks with dirty configuration. Run 'configure apply'.",
-        }
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = {
+        AppcliCommand.CONFIGURE_INIT: EXISTING_CONFIGURATION_ERROR_MESSAGE,
+        AppcliCommand.MIGRATE: "Cannot migrate with a dirty configuration. Run 'configure apply'.",
+    }
+    disallowed_command_unless_forced = {
+        AppcliCommand.SERVICE_START: "Cannot start with dirty configuration. Run 'configure apply'.",
+        AppcliCommand.TASK_RUN: "Cannot run task with dirty configuration. Run 'configure apply'.",
+        AppcliCommand.ORCHESTRATOR: "Cannot run orchestrator tasks with dirty configuration. Run 'configure apply'.",
+    }
 
 
 class DirtyGenConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where generated directory is dirty."""
 
-    def __init__(self) -> None:
-        disallowed_command = {
-            AppcliCommand.CONFIGURE_INIT: "Cannot initialise an existing configuration.",
-            AppcliCommand.MIGRATE: "Cannot migrate with a dirty generated configuration. Run 'configure apply'.",
-        }
-        disallowed_command_unless_forced = {
-            AppcliCommand.CONFIGURE_APPLY: "Cannot 'configure apply' over a dirty generated directory as it will overwrite existing modifications.",
-            AppcliCommand.SERVICE_START: "Cannot start service with dirty generated configuration. Run 'configure apply'.",
-            AppcliCommand.TASK_RUN: "Cannot run task with dirty generated configuration. Run 'configure apply'.",
-            AppcliCommand.ORCHESTRATOR: "Cannot run orchestrator tasks with dirty generated configuration. Run 'configure apply'.",
-        }
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    disallowed_command = {
+        AppcliCommand.CONFIGURE_INIT: EXISTING_CONFIGURATION_ERROR_MESSAGE,
+        AppcliCommand.MIGRATE: "Cannot migrate with a dirty generated configuration. Run 'configure apply'.",
+    }
+    disallowed_command_unless_forced = {
+        AppcliCommand.CONFIGURE_APPLY: "Cannot 'configure apply' over a dirty generated directory as it will overwrite existing modifications.",
+        AppcliCommand.SERVICE_START: "Cannot start service with dirty generated configuration. Run 'configure apply'.",
+        AppcliCommand.TASK_RUN: "Cannot run task with dirty generated configuration. Run 'configure apply'.",
+        AppcliCommand.ORCHESTRATOR: "Cannot run orchestrator tasks with dirty generated configuration. Run 'configure apply'.",
+    }
 
 
 class DirtyConfAndGenConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where both the conf and generated directory are dirty."""
 
-    def __init__(self) -> None:
-        disallowed_command = {
-            AppcliCommand.CONFIGURE_INIT: "Cannot initialise an existing configuration.",
-            AppcliCommand.MIGRATE: "Cannot migrate with a dirty generated configuration. Run 'configure apply'.",
-        }
-        disallowed_command_unless_forced = {
-            AppcliCommand.CONFIGURE_APPLY: "Cannot 'configure apply' over a dirty generated directory as it will overwrite existing modifications.",
-            AppcliCommand.SERVICE_START: "Cannot start service with dirty generated configuration. Run 'configure apply'.",
-            AppcliCommand.TASK_RUN: "Cannot run task with dirty generated configuration. Run 'configure apply'.",
-            AppcliCommand.ORCHESTRATOR: "Cannot run orchestrator tasks with dirty generated configuration. Run 'configure apply'.",
-        }
+    __slots__ = ()
 
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
+    # A dirty generated directory is the more restrictive of the two, so share its tables.
+    disallowed_command = DirtyGenConfigurationDirState.disallowed_command
+    disallowed_command_unless_forced = (
+        DirtyGenConfigurationDirState.disallowed_command_unless_forced
+    )
 
 
 class RequiresMigrationConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where configuration and application versions are misaligned."""
 
+    # The tables depend on the error message, so are held per instance.
+    __slots__ = (
+        "error",
+        "disallowed_command",
+        "disallowed_command_unless_forced",
+        "command_table",
+    )
+
     def __init__(self, error: str) -> None:
-        disallowed_command = get_disallowed_command_from_allowed_commands(
-            [AppcliCommand.MIGRATE], error
+        self.error = error
+        self.disallowed_command = MappingProxyType(
+            get_disallowed_command_from_allowed_commands([AppcliCommand.MIGRATE], error)
+        )
+        self.disallowed_command_unless_forced = MappingProxyType({})
+        self.command_table = build_command_table(
+            self.disallowed_command, self.disallowed_command_unless_forced
         )
-        disallowed_command_unless_forced = {}
-
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
 
 
 class InvalidConfigurationDirState(ConfigurationDirState):
     """Represents the configuration dir state where configuration is invalid and incompatible with appcli."""
 
+    # The tables depend on the error message, so are held per instance.
+    __slots__ = (
+        "error",
+        "disallowed_command",
+        "disallowed_command_unless_forced",
+        "command_table",
+    )
+
     def __init__(self, error: str) -> None:
-        default_error_message = f"Invalid configuration state, this error must be rectified before continuing. {error}"
+        self.error = error
+        default_error_message = INVALID_ERROR_MESSAGE.format(error=error)
 
         # Remove the 'VIEW_BACKUPS' and 'RESTORE' commands from the set of 'disallowed' commands so that we can add them
         # as 'disallowed unless forced' commands
-        disallowed_command = get_disallowed_command_from_allowed_commands(
-            [AppcliCommand.VIEW_BACKUPS, AppcliCommand.RESTORE], default_error_message
+        self.disallowed_command = MappingProxyType(
+            get_disallowed_command_from_allowed_commands(
+                [AppcliCommand.VIEW_BACKUPS, AppcliCommand.RESTORE],
+                default_error_message,
+            )
+        )
+        self.disallowed_command_unless_forced = MappingProxyType(
+            {
+                AppcliCommand.VIEW_BACKUPS: default_error_message,
+                AppcliCommand.RESTORE: default_error_message,
+            }
+        )
+        self.command_table = build_command_table(
+            self.disallowed_command, self.disallowed_command_unless_forced
         )
-        disallowed_command_unless_forced = {
-            AppcliCommand.VIEW_BACKUPS: default_error_message,
-            AppcliCommand.RESTORE: default_error_message,
-        }
-        super().__init__(disallowed_command, disallowed_command_unless_forced)
-
-
-def get_disallowed_command_from_allowed_commands(
-    allowed_commands: Iterable[AppcliCommand], error_message: str
-) -> dict:
-    """Given an Iterable of allowed appcli commands, generates the dict of disallowed commands.
-
-    Args:
-        allowed_commands (Iterable[AppcliCommand]): Allowed commands.
-        error_message (str): Error message for disallowed commands.
 
-    Returns:
-        dict: [description]
-    """
 
-    disallowed_commands = dict(defaultdict.fromkeys(list(AppcliCommand), error_message))
+# ------------------------------------------------------------------------------
+# STATE INSTANCES
+# ------------------------------------------------------------------------------
 
-    for command in allowed_commands:
-        disallowed_commands.pop(command, None)
+# States which don't take an error message are identical for every call to the
+# factory, so a single shared instance of each is built at import time.
 
-    return disallowed_commands
+NO_DIRECTORY_PROVIDED_CONFIGURATION_DIR_STATE = (
+    NoDirectoryProvidedConfigurationDirState()
+)
+NO_DIRECTORY_PROVIDED_BACKUP_DIR_STATE = NoDirectoryProvidedBackupDirState()
+BACKUP_DIRECTORY_DOES_NOT_EXIST_STATE = BackupDirectoryDoesNotExist()
+UNINITIALISED_CONFIGURATION_DIR_STATE = UninitialisedConfigurationDirState()
+UNAPPLIED_CONFIGURATION_DIR_STATE = UnappliedConfigurationDirState()
+CLEAN_CONFIGURATION_DIR_STATE = CleanConfigurationDirState()
+DIRTY_CONF_CONFIGURATION_DIR_STATE = DirtyConfConfigurationDirState()
+DIRTY_GEN_CONFIGURATION_DIR_STATE = DirtyGenConfigurationDirState()
+DIRTY_CONF_AND_GEN_CONFIGURATION_DIR_STATE = DirtyConfAndGenConfigurationDirState()
+
+DIRTY_STATES = {
+    (True, True): DIRTY_CONF_AND_GEN_CONFIGURATION_DIR_STATE,
+    (True, False): DIRTY_CONF_CONFIGURATION_DIR_STATE,
+    (False, True): DIRTY_GEN_CONFIGURATION_DIR_STATE,
+}
+""" The dirty states, keyed on whether the (conf, generated) repositories are dirty. """
+
+SHARED_STATES = {
+    state.__class__.__name__: state
+    for state in (
+        UNAPPLIED_CONFIGURATION_DIR_STATE,
+        CLEAN_CONFIGURATION_DIR_STATE,
+        DIRTY_CONF_CONFIGURATION_DIR_STATE,
+        DIRTY_GEN_CONFIGURATION_DIR_STATE,
+        DIRTY_CONF_AND_GEN_CONFIGURATION_DIR_STATE,
+    )
+}
+""" The shared states which can be restored from the state cache, keyed on class name. """
+
+ERROR_STATES = {
+    state_class.__name__: state_class
+    for state_class in (
+        RequiresMigrationConfigurationDirState,
+        InvalidConfigurationDirState,
+    )
+}
+""" The states constructed from an error message which can be restored from the state cache, keyed on class name. """
@@ -10,6 +10,7 @@ www.brightsparklabs.com
 """
 
 # standard library
+import hashlib
 import json
 import os
 import shutil
@@ -17,17 +18,25 @@ import tarfile
 import tempfile
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable
+from stat import S_ISLNK, S_ISREG
+from typing import Iterable, Optional
 
 import jsonschema
 import ruamel.yaml
 
 # vendor libraries
-from jinja2 import StrictUndefined, Template
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    StrictUndefined,
+    Template,
+)
 
 # local libraries
 from appcli.crypto import crypto
-from appcli.crypto.crypto import decrypt_values_in_file
+from appcli.crypto.cipher import Cipher
+from appcli.crypto.crypto import decrypt_values_in_file_with_cipher
 from appcli.functions import error_and_exit, print_header
 from appcli.git_repositories.git_repositories import (
     ConfigurationGitRepository,
@@ -45,6 +54,9 @@ from appcli.variables_manager import VariablesManager
 METADATA_FILE_NAME = "metadata-configure-apply.json"
 """ Name of the file holding metadata from running a configure (relative to the generated configuration directory) """
 
+TEMPLATE_BYTECODE_CACHE_DIR_NAME = "template-bytecode-cache"
+""" Name of the directory caching compiled templates (relative to the configuration metadata directory) """
+
 YAML_LOADER = ruamel.yaml.YAML()
 FILETYPE_LOADERS = {
     ".json": json.load,
@@ -369,18 +381,18 @@ class ConfigurationManager:
                 f"Seed templates directory [{seed_configurable_templates_dir}] is not valid. Release is corrupt."
             )
 
-        # Copy each seed file to the configurable templates directory
-        for source_file in seed_configurable_templates_dir.glob("**/*"):
-            logger.debug(source_file)
-            relative_file = source_file.relative_to(seed_configurable_templates_dir)
-            target_file = configurable_templates_dir.joinpath(relative_file)
-
-            if source_file.is_dir():
-                logger.debug("Creating directory [%s] ...", target_file)
-                target_file.mkdir(parents=True, exist_ok=True)
-            else:
-                logger.debug("Copying seed file to [%s] ...", target_file)
-                shutil.copy2(source_file, target_file)
+        # Copy the seed files to the configurable templates directory. 'copytree' walks the tree with 'os.scandir' and
+        # copies each file using the kernel's zero-copy fast path where available.
+        logger.debug(
+            "Copying seed files from [%s] to [%s] ...",
+            seed_configurable_templates_dir,
+            configurable_templates_dir,
+        )
+        shutil.copytree(
+            seed_configurable_templates_dir,
+            configurable_templates_dir,
+            dirs_exist_ok=True,
+        )
 
     def __regenerate_generated_configuration(self):
         """Generate the generated configuration files"""
@@ -390,28 +402,35 @@ class ConfigurationManager:
             self.config_repo.get_repository_version()
         )
 
+        # The settings do not change between the template directories, so only load and render them once
+        template_data = self.variables_manager.get_templating_configuration()
+
         logger.info("Generating configuration from default templates")
         self.__apply_templates_from_directory(
-            self.cli_configuration.baseline_templates_dir, generated_configuration_dir
+            self.cli_configuration.baseline_templates_dir,
+            generated_configuration_dir,
+            template_data,
         )
 
         logger.info("Generating configuration from override templates")
         self.__apply_templates_from_directory(
             self.cli_context.get_baseline_template_overrides_dir(),
             generated_configuration_dir,
+            template_data,
         )
 
         logger.info("Generating configuration from configurable templates")
         self.__apply_templates_from_directory(
             self.cli_context.get_configurable_templates_dir(),
             generated_configuration_dir,
+            template_data,
         )
 
         files_to_decrypt = self.cli_configuration.decrypt_generated_files
         if len(files_to_decrypt) > 0:
             self.__decrypt_generated_files(
                 self.cli_context.get_key_file(),
-                self.cli_context.get_generated_configuration_dir(),
+                generated_configuration_dir,
                 files_to_decrypt,
             )
 
@@ -424,7 +443,7 @@ class ConfigurationManager:
         # By re-instantiating the 'GeneratedConfigurationGitRepository', we put
         # the generated config repo under version control.
         generated_config_repo = GeneratedConfigurationGitRepository(
-            self.cli_context.get_generated_configuration_dir()
+            generated_configuration_dir
         )
 
         logger.debug(
@@ -432,41 +451,80 @@ class ConfigurationManager:
         )
 
     def __apply_templates_from_directory(
-        self, template_path: Path, generated_configuration_dir: Path
+        self,
+        template_path: Path,
+        generated_configuration_dir: Path,
+        template_data: dict,
     ):
         """Applies templates from a source directory to the generated directory
 
         Args:
             template_path (Path): directory to the templates
             generated_configuration_dir (Path): directory to output generated files
+            template_data (dict): variables used to populate the templates
         """
-        template_data = self.variables_manager.get_templating_configuration()
-        for template_file in template_path.glob("**/*"):
-            relative_file = template_file.relative_to(template_path)
-            target_file = generated_configuration_dir.joinpath(relative_file)
+        template_environment = self.__get_template_environment(template_path)
+        # 'os.walk' is backed by 'os.scandir', so entry types come from the directory listing rather than a 'stat' per
+        # entry as with 'Path.glob'.
+        for dir_path, _, file_names in os.walk(template_path):
+            relative_dir = Path(dir_path).relative_to(template_path)
+            target_dir = generated_configuration_dir.joinpath(relative_dir)
+            logger.debug("Creating directory [%s] ...", target_dir)
+            target_dir.mkdir(parents=True, exist_ok=True)
+
+            for file_name in file_names:
+                template_file = Path(dir_path, file_name)
+                relative_file = relative_dir.joinpath(file_name)
+                target_file = target_dir.joinpath(file_name)
+
+                # If its an appcli schema file we ignore it.
+                if f"{IGNORE_INFIX}." in file_name:
+                    logger.debug("Ignoring appcli schema file [%s] ...", template_file)
+                # If its a j2 file we template and copy.
+                elif template_file.suffix == ".j2":
+                    # parse jinja2 templates against configuration
+                    target_file = target_file.with_suffix("")
+                    logger.debug("Generating configuration file [%s] ...", target_file)
+                    self.__generate_from_template(
+                        template_environment.get_template(relative_file.as_posix()),
+                        target_file,
+                        template_data,
+                    )
+                # If its a regular file we just copy it.
+                else:
+                    logger.debug("Copying configuration file to [%s] ...", target_file)
+                    # Only the permission bits matter (e.g. executable scripts), the file is regenerated on every
+                    # apply so copying its timestamps as well is wasted work.
+                    shutil.copy(template_file, target_file)
+
+    def __get_template_environment(self, template_path: Path) -> Environment:
+        """Gets the Jinja environment used to load templates from a directory. Compiled templates are cached in the
+        configuration metadata directory, so unchanged templates are not recompiled on every apply.
 
-            if template_file.is_dir():
-                logger.debug("Creating directory [%s] ...", target_file)
-                target_file.mkdir(parents=True, exist_ok=True)
-                continue
+        Args:
+            template_path (Path): directory to the templates
 
-            # If its an appcli schema file we ignore it.
-            if f"{IGNORE_INFIX}." in template_file.name:
-                logger.debug("Ignoring appcli schema file [%s] ...", template_file)
-            # If its a j2 file we template and copy.
-            elif template_file.suffix == ".j2":
-                # parse jinja2 templates against configuration
-                target_file = target_file.with_suffix("")
-                logger.debug("Generating configuration file [%s] ...", target_file)
-                self.__generate_from_template(
-                    template_file,
-                    target_file,
-                    template_data,
-                )
-            # If its a regular file we just copy it.
-            else:
-                logger.debug("Copying configuration file to [%s] ...", target_file)
-                shutil.copy2(template_file, target_file)
+        Returns:
+            Environment: the Jinja environment
+        """
+        bytecode_cache_dir = self.cli_context.get_configuration_metadata_dir().joinpath(
+            TEMPLATE_BYTECODE_CACHE_DIR_NAME
+        )
+        try:
+            bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(str(bytecode_cache_dir))
+        except OSError as e:
+            # The cache is purely an optimisation, templates are compiled on each apply without it.
+            logger.debug("Not caching compiled templates: %s", e)
+            bytecode_cache = None
+
+        return Environment(
+            loader=FileSystemLoader(template_path),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            bytecode_cache=bytecode_cache,
+        )
 
     def __directory_is_not_empty(self, directory: Path) -> bool:
         """Checks if a directory is not empty.
@@ -474,12 +532,24 @@ class ConfigurationManager:
         Returns:
             bool: Returns True if the directory exists and contains any files, otherwise False
         """
-        if not os.path.exists(directory):
+        try:
+            with os.scandir(directory) as entries:
+                return any(entry.name != ".gitkeep" for entry in entries)
+        except FileNotFoundError:
             return False
 
-        files_in_directory = [i for i in os.listdir(directory) if i != ".gitkeep"]
+    def __directory_has_entries(self, directory: Path) -> bool:
+        """Checks if a directory contains anything at all. Stops reading the directory at the first entry, rather than
+        listing the whole directory.
 
-        return len(files_in_directory) > 0
+        Returns:
+            bool: Returns True if the directory exists and contains any entries, otherwise False
+        """
+        try:
+            with os.scandir(directory) as entries:
+                return next(entries, None) is not None
+        except FileNotFoundError:
+            return False
 
     def __backup_directory(self, directory_to_backup: Path) -> Path:
         """Backup a specified directory to a temporary directory
@@ -494,11 +564,7 @@ class ConfigurationManager:
             return None
 
         temp_dir = Path(tempfile.mkdtemp())
-
-        # Due to a limitation with 'copytree', it fails to copy if the root directory exists
-        # before copying. So we delete the temp dir prior to copying.
-        os.rmdir(temp_dir)
-        shutil.copytree(str(directory_to_backup), str(temp_dir), dirs_exist_ok=True)
+        shutil.copytree(directory_to_backup, temp_dir, dirs_exist_ok=True)
 
         return temp_dir
 
@@ -523,8 +589,7 @@ class ConfigurationManager:
         if source_dir is None or not source_dir.exists() or not source_dir.is_dir():
             return
 
-        os.mkdir(target_dir)
-        shutil.copytree(str(source_dir), str(target_dir), dirs_exist_ok=True)
+        shutil.copytree(source_dir, target_dir)
 
     def __backup_and_create_new_generated_config_dir(
         self, current_config_version
@@ -540,26 +605,20 @@ class ConfigurationManager:
         )
 
     def __generate_from_template(
-        self, template_file: Path, target_file: Path, variables: dict
+        self, template: Template, target_file: Path, variables: dict
     ):
         """
-        Generate configuration file from the specified template file using
+        Generate configuration file from the specified template using
         the supplied variables.
 
         Args:
-            template_file (Path): Template used to generate the file.
+            template (Template): Template used to generate the file.
             target_file (Path): Location to write the generated file to.
             variables (dict): Variables used to populate the template.
         """
-        template = Template(
-            template_file.read_text(),
-            undefined=StrictUndefined,
-            trim_blocks=True,
-            lstrip_blocks=True,
-        )
         try:
-            output_text = template.render(variables)
-            target_file.write_text(output_text)
+            # Stream the rendered output to file rather than building it up as one string in memory first.
+            template.stream(variables).dump(str(target_file), encoding="utf-8")
         except Exception as e:
             error_and_exit(
                 f"Could not generate file from template. The configuration file is likely missing a setting: {e}"
@@ -578,11 +637,13 @@ class ConfigurationManager:
             generated_config_dir (Path): Path to the generated configuration directory.
             files (Iterable[str]): Relative path to the files to decrypt. Resolved against the generated configuration directory.
         """
+        # Only read the key file once for all files
+        cipher = Cipher(key_file)
         for relative_file in files:
             # decrypt and overwrite the file
             target_file = generated_config_dir.joinpath(relative_file)
             logger.debug("Decrypting [%s] ...", target_file)
-            decrypt_values_in_file(target_file, target_file, key_file)
+            decrypt_values_in_file_with_cipher(target_file, target_file, cipher)
 
     def __copy_settings_files_to_generated_dir(self):
         """Copies the current settings file and encryption key to the generated directory as a record of what configuration
@@ -594,18 +655,16 @@ class ConfigurationManager:
 
         generated_config_dir = self.cli_context.get_generated_configuration_dir()
 
+        app_configuration_file = self.cli_context.get_app_configuration_file()
         applied_configuration_file = generated_config_dir.joinpath(
-            self.cli_context.get_app_configuration_file().name
-        )
-        shutil.copy2(
-            self.cli_context.get_app_configuration_file(), applied_configuration_file
+            app_configuration_file.name
         )
+        shutil.copy2(app_configuration_file, applied_configuration_file)
 
         logger.debug("Copying applied key file to generated configuration directory")
-        applied_key_file = generated_config_dir.joinpath(
-            self.cli_context.get_key_file().name
-        )
-        shutil.copy2(self.cli_context.get_key_file(), applied_key_file)
+        key_file = self.cli_context.get_key_file()
+        applied_key_file = generated_config_dir.joinpath(key_file.name)
+        shutil.copy2(key_file, applied_key_file)
 
         logger.debug(
             "Applied settings and key file written to [%s] and [%s]",
@@ -615,16 +674,19 @@ class ConfigurationManager:
 
     def __generate_configuration_metadata_file(self):
         record = {
-            "generated_at": datetime.utcnow().replace(tzinfo=timezone.utc).isoformat(),
+            "generated_at": datetime.now(timezone.utc).isoformat(),
             "generated_from_commit": self.config_repo.get_current_commit_hash(),
         }
         configuration_record_file = self.__get_generated_configuration_metadata_file(
             self.cli_context
         )
-        # Overwrite the existing generated configuration metadata record file
-        configuration_record_file.write_text(
-            json.dumps(record, indent=2, sort_keys=True)
+        # Overwrite the existing generated configuration metadata record file. Write to a temporary file first and
+        # rename it into place, so the record is never left partially written.
+        temp_file = configuration_record_file.with_name(
+            f"{configuration_record_file.name}.{os.getpid()}.tmp"
         )
+        temp_file.write_text(json.dumps(record, indent=2, sort_keys=True))
+        os.replace(temp_file, configuration_record_file)
         logger.debug("Configuration record written to [%s]", configuration_record_file)
 
     def __backup_and_create_new_directory(
@@ -644,12 +706,10 @@ class ConfigurationManager:
                 This is implemented as a FIFO queue based off the timestamp.
         """
 
-        if source_dir.exists() and os.listdir(source_dir):
-            # The datetime is accurate to seconds (microseconds was overkill), and we remove
-            # colon (:) because `tar tvf` doesn't like filenames with colons
-            current_datetime = (
-                datetime.now().replace(microsecond=0).isoformat().replace(":", "")
-            )
+        if self.__directory_has_entries(source_dir):
+            # The datetime is accurate to seconds (microseconds was overkill), and has no
+            # colons (:) because `tar tvf` doesn't like filenames with colons
+            current_datetime = datetime.now().strftime("%Y-%m-%dT%H%M%S")
             # We have to do a replacement in case it has a slash in it, which causes the
             # creation of the tar file to fail
             clean_additional_filename_descriptor = (
@@ -667,17 +727,37 @@ class ConfigurationManager:
             if len(old_backups) > maximum_backups:
                 [archive.unlink() for archive in old_backups[maximum_backups:]]
 
-            # Create the backup
-            logger.debug(f"Backing up directory [{source_dir}] to [{backup_file}]")
-            if not backup_dir.exists():
-                backup_dir.mkdir()
-            with tarfile.open(backup_file, "w:gz") as tar:
-                tar.add(source_dir, arcname=source_dir.name)
-
-            # Ensure the backup has been successfully created before deleting the existing generated configuration directory
-            if not backup_file.exists():
-                error_and_exit(
-                    f"Current generated configuration directory backup failed. Could not write out file [{backup_file}]."
+            # Skip the backup if the directory is unchanged since the latest backup. E.g. re-applying unchanged
+            # configuration would otherwise archive an identical copy on every apply.
+            last_backup_record_file = backup_dir / f"{source_dir.name}-last-backup.json"
+            content_hash = self.__get_directory_content_hash(
+                source_dir, clean_additional_filename_descriptor
+            )
+            unchanged_backup_file = self.__get_unchanged_backup_file(
+                last_backup_record_file, content_hash
+            )
+            if unchanged_backup_file is not None:
+                logger.debug(
+                    f"Directory [{source_dir}] is unchanged since backup [{unchanged_backup_file}], not backing up again"
+                )
+            else:
+                # Create the backup
+                logger.debug(f"Backing up directory [{source_dir}] to [{backup_file}]")
+                if not backup_dir.exists():
+                    backup_dir.mkdir()
+                # The backups are mostly small text files, so the fastest gzip level still compresses them well
+                # while avoiding the CPU cost of the default (maximum) level.
+                with tarfile.open(backup_file, "w:gz", compresslevel=1) as tar:
+                    tar.add(source_dir, arcname=source_dir.name)
+
+                # Ensure the backup has been successfully created before deleting the existing generated configuration directory
+                if not backup_file.exists():
+                    error_and_exit(
+                        f"Current generated configuration directory backup failed. Could not write out file [{backup_file}]."
+                    )
+
+                last_backup_record_file.write_text(
+                    json.dumps({"hash": content_hash, "backup_file": backup_filename})
                 )
 
             # Remove the existing directory
@@ -692,6 +772,65 @@ class ConfigurationManager:
 
         return source_dir
 
+    def __get_directory_content_hash(self, directory: Path, descriptor: str) -> str:
+        """Hashes the contents of a directory (entry names, modes, symlink targets and file contents), for comparing it
+        against the latest backup. The directory's git repository and the apply metadata file are excluded, since they
+        differ on every apply even when the generated files do not.
+
+        Args:
+            directory (Path): The directory to hash.
+            descriptor (str): The additional identifier put into the backup filename. Included in the hash so that
+                e.g. a version change is always backed up.
+
+        Returns:
+            str: The hex digest of the directory contents.
+        """
+        content_hash = hashlib.sha1(descriptor.encode())
+        for dir_path, dir_names, file_names in os.walk(directory):
+            relative_dir = Path(dir_path).relative_to(directory)
+            if relative_dir == Path("."):
+                dir_names[:] = [d for d in dir_names if d != ".git"]
+                file_names = [f for f in file_names if f != METADATA_FILE_NAME]
+            # Walk in a stable order so the same contents always produce the same hash
+            dir_names.sort()
+            for name in sorted(dir_names + file_names):
+                # Hash what the backup archive records for each entry: its mode, a symlink's target (links are not
+                # followed, and may dangle) and a regular file's contents. Other entries (e.g. FIFOs) are never read.
+                path = os.path.join(dir_path, name)
+                stat = os.lstat(path)
+                content_hash.update(
+                    f"{relative_dir.joinpath(name)}\0{stat.st_mode}\0".encode()
+                )
+                if S_ISLNK(stat.st_mode):
+                    content_hash.update(f"{os.readlink(path)}\0".encode())
+                elif S_ISREG(stat.st_mode):
+                    file_contents = Path(path).read_bytes()
+                    content_hash.update(f"{len(file_contents)}\0".encode())
+                    content_hash.update(file_contents)
+        return content_hash.hexdigest()
+
+    def __get_unchanged_backup_file(
+        self, last_backup_record_file: Path, content_hash: str
+    ) -> Optional[Path]:
+        """Gets the latest backup if it was taken of identical directory contents and still exists.
+
+        Args:
+            last_backup_record_file (Path): The file recording the hash and name of the latest backup.
+            content_hash (str): The hash of the current directory contents.
+
+        Returns:
+            Optional[Path]: The latest backup if it matches, otherwise None.
+        """
+        try:
+            last_backup = json.loads(last_backup_record_file.read_text())
+            backup_file = last_backup_record_file.parent / last_backup["backup_file"]
+            if last_backup["hash"] == content_hash and backup_file.is_file():
+                return backup_file
+        except (OSError, ValueError, KeyError, TypeError):
+            # A missing or unreadable record just means the directory gets backed up.
+            pass
+        return None
+
     def __get_generated_configuration_metadata_file(
         self, cli_context: CliContext
     ) -> Path:
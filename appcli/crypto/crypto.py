@@ -35,7 +35,16 @@ def create_and_save_key(key_file: Path):
 
 
 def decrypt_values_in_file(encrypted_file: Path, decrypted_file: Path, key_file: Path):
-    cipher = Cipher(key_file)
+    decrypt_values_in_file_with_cipher(encrypted_file, decrypted_file, Cipher(key_file))
+
+
+def decrypt_values_in_file_with_cipher(
+    encrypted_file: Path, decrypted_file: Path, cipher: Cipher
+):
+    """Decrypts all encrypted values in a file using an existing cipher. Use this
+    rather than `decrypt_values_in_file` when decrypting several files, so the key
+    file is only read once.
+    """
     regex = "enc:[^:]+:[^:]+:end"
     cache = {}
 
@@ -69,8 +69,7 @@ class GitRepository:
             f"Created .gitignore at [{gitignore_path}] with ignores: [%s]", self.ignores
         )
 
-        repo.git.add(".gitignore")
-        repo.git.add("*")
+        repo.git.add(".gitignore", "*")
         repo.index.commit("[autocommit] Initialised repository", author=self.actor)
         return repo
 
@@ -112,8 +111,8 @@ class GitRepository:
             self.repo.working_dir,
         )
 
-        self.repo.git.add(".gitignore")
-        self.repo.git.add("*")
+        # Stage everything with a single `git add` process.
+        self.repo.git.add(".gitignore", "*")
         self.repo.index.commit(message, author=self.actor)
         return True
 
@@ -127,8 +126,8 @@ class GitRepository:
         if self.does_branch_exist(branch_name):
             error_and_exit(f"Cannot create new branch {branch_name}. Already exists.")
 
-        self.checkout_existing_branch("master")
-        self.repo.git.checkout("HEAD", b=branch_name)
+        # Equivalent to checking out master and branching from there, with one `git checkout` process.
+        self.repo.git.checkout(BASE_BRANCH_NAME, b=branch_name)
 
     def checkout_existing_branch(self, branch_name: str):
         """Checkout an existing branch
@@ -161,11 +160,9 @@ class GitRepository:
         Returns:
             bool: True if the branch exists, otherwise false
         """
-        try:
-            self.repo.git.show_ref(f"refs/heads/{branch_name}", verify=True, quiet=True)
-            return True
-        except Exception:
-            return False
+        # Read the refs in-process rather than running `git show-ref`. Compare names explicitly, as `in` on GitPython's
+        # IterableList also matches the list's own attributes (e.g. 'index', 'count').
+        return any(head.name == branch_name for head in self.repo.heads)
 
     def tag_current_commit(self, tag_name: str):
         """Tag the current commit with a tag name
@@ -192,7 +189,8 @@ class GitRepository:
         Returns:
             str: Commit hash of the current commit.
         """
-        return self.repo.git.rev_parse("HEAD")
+        # Resolved through GitPython's persistent `git cat-file` process rather than a new `git rev-parse` process.
+        return self.repo.head.commit.hexsha
 
     def rename_current_branch(self, branch_name: str):
         """Renames the current branch
@@ -222,6 +220,16 @@ class GitRepository:
         count = self.repo.git.rev_list(("--all", "--count"))
         return int(count)
 
+    def has_multiple_commits(self) -> bool:
+        """Checks if this repo has more than one commit. Unlike `get_commit_count`, this stops walking the history
+        once a second commit is found.
+
+        Returns:
+            bool: True if the repo has more than one commit, otherwise False.
+        """
+        count = self.repo.git.rev_list(("--all", "--count", "--max-count=2"))
+        return int(count) > 1
+
     def is_repo_on_master_branch(self) -> bool:
         return self.__get_current_branch_name() == "master"
 
@@ -231,7 +239,8 @@ class GitRepository:
         Returns:
             str: name of the current branch
         """
-        return self.repo.git.symbolic_ref("HEAD", short=True).replace("heads/", "")
+        # Resolve HEAD by reading the ref files directly rather than running a `git symbolic-ref` subprocess.
+        return self.repo.head.reference.name
 
 
 class ConfigurationGitRepository(GitRepository):
@@ -116,10 +116,12 @@ class CliContext(NamedTuple):
 
         try:
             generated_configuration_dir = self.get_generated_configuration_dir()
+            configuration_metadata_dir = self.get_configuration_metadata_dir()
         except AttributeError:
             # If configuration_dir is None (like when we do an 'install'), then this raises AttributeError exception.
             # We cannot determine the generated_configuration_dir, so set it to None.
             generated_configuration_dir = None
+            configuration_metadata_dir = None
 
         configuration_dir_state: ConfigurationDirState = (
             ConfigurationDirStateFactory.get_state(
@@ -127,6 +129,7 @@ class CliContext(NamedTuple):
                 generated_configuration_dir,
                 self.app_version,
                 self.backup_dir,
+                configuration_metadata_dir,
             )
         )
         logger.debug(
@@ -10,11 +10,13 @@ www.brightsparklabs.com
 """
 
 # standard library
+import copy
 import os
 import re
-from functools import reduce
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Union
+from typing import Any, Dict, Tuple, Union
 
 from jinja2 import StrictUndefined, Template
 
@@ -26,6 +28,18 @@ from appcli.crypto.crypto import decrypt_value
 # local libraries
 from appcli.logger import logger
 
+# ------------------------------------------------------------------------------
+# VARIABLES
+# ------------------------------------------------------------------------------
+
+YAML_FILE_CACHE_RACY_WINDOW_NS = 2_000_000_000
+""" Files modified within this many nanoseconds are considered too recent to cache, as they could be modified again
+without their stat data changing. """
+
+_yaml_file_cache: Dict[Path, Tuple[Tuple[int, int, int, int], Any]] = {}
+""" Parsed yaml files keyed on path. Each entry holds the (mtime_ns, size, ctime_ns, inode) of the file when it was
+parsed, and is only reused while those are unchanged. """
+
 # ------------------------------------------------------------------------------
 # PUBLIC CLASSES
 # ------------------------------------------------------------------------------
@@ -34,6 +48,9 @@ from appcli.logger import logger
 class VariablesManager:
     """Manages the configuration variables"""
 
+    yaml = YAML()
+    """ Round-trip YAML instance, shared by all instances as it is expensive to construct. """
+
     def __init__(
         self,
         configuration_file: Path,
@@ -70,8 +87,6 @@ class VariablesManager:
                 f"Found application context files [{self.application_context_files}]."
             )
 
-        self.yaml = YAML()
-
     ############################################################################
     # MAIN CONFIGURATION FUNCTIONS
     ############################################################################
@@ -101,19 +116,16 @@ class VariablesManager:
         """
         configuration = self._get_main_configuration()
 
-        path_elements = path.split(".")
-        parent_path = path_elements[:-1]
+        path_elements = _split_path(path)
 
-        # ensure parent path exists
-        def ensure_path(parent, child):
-            if child not in parent:
-                parent[child] = {}
-            return parent[child]
-
-        reduce(ensure_path, parent_path, configuration)
+        # walk to the parent element, creating any missing elements along the way
+        parent_element = configuration
+        for key in path_elements[:-1]:
+            if key not in parent_element:
+                parent_element[key] = {}
+            parent_element = parent_element[key]
 
         # set the value
-        parent_element = reduce(lambda e, k: e[k], parent_path, configuration)
         parent_element[path_elements[-1]] = value
 
         self._save(configuration)
@@ -147,6 +159,7 @@ class VariablesManager:
         logger.debug(f"Saving configuration to [{full_path}] ...")
         with open(full_path, "w") as config_file:
             self.yaml.dump(variables, config_file)
+        _invalidate_yaml_file_cache(self.configuration_file)
 
     ############################################################################
     # STACK CONFIGURATION FUNCTIONS
@@ -205,7 +218,9 @@ class VariablesManager:
 
     def _get_variable_from_dict(self, path: str, data: Dict, decrypt: bool = False):
         try:
-            variable = reduce(lambda e, k: e[k], path.split("."), data)
+            variable = data
+            for key in _split_path(path):
+                variable = variable[key]
         except KeyError as exc:
             raise KeyError(f"Setting [{path}] not set in configuration.") from exc
 
@@ -217,14 +232,49 @@ class VariablesManager:
     def _load_yaml_to_dict(self, data: Union[str, Path]) -> Dict:
         """Reads in YAML to a Dict. Accepts data as a string or a Path to yaml file.
 
+        Args:
+            data (Union[str, Path]): The yaml data, or the path to the yaml file.
+
         Returns:
             Dict: The yaml data as a Dict. An empty file or empty data will return an empty dict.
         """
+        if isinstance(data, Path):
+            return self._load_yaml_file_to_dict(data)
+
         yaml_data = self.yaml.load(data)
         if yaml_data is None:
             return {}
         return yaml_data
 
+    def _load_yaml_file_to_dict(self, file: Path) -> Dict:
+        """Reads in a YAML file to a Dict. The parsed file is cached until the file is modified, so repeated reads of
+        the same settings file only pay for a copy rather than a re-parse.
+
+        Args:
+            file (Path): Path to the yaml file.
+
+        Returns:
+            Dict: The yaml data as a Dict. An empty file will return an empty dict.
+        """
+        stat = file.stat()
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ctime_ns, stat.st_ino)
+        cache_key = file.absolute()
+
+        cached = _yaml_file_cache.get(cache_key)
+        if cached is None or cached[0] != signature:
+            yaml_data = self.yaml.load(file)
+            cached = (signature, {} if yaml_data is None else yaml_data)
+            # Only cache the file once it has settled. The change time is checked too, as the modification time can
+            # be restored (e.g. `cp -p`, `touch -r`).
+            if (
+                max(stat.st_mtime_ns, stat.st_ctime_ns)
+                < time.time_ns() - YAML_FILE_CACHE_RACY_WINDOW_NS
+            ):
+                _yaml_file_cache[cache_key] = cached
+
+        # Callers are free to modify the returned data, so never hand out the cached instance.
+        return copy.deepcopy(cached[1])
+
     def _get_application_context_variables(self, variables: Dict) -> Dict:
         """Gets the configuration from the application context files.
 
@@ -300,3 +350,32 @@ class VariablesManager:
         if re.match(regex, key) is None:
             raise Exception(f"Could not generate a valid yaml key from file [{file}].")
         return key
+
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+
+@lru_cache(maxsize=1024)
+def _split_path(path: str) -> Tuple[str, ...]:
+    """Splits a dot notation setting path into its elements. The same paths are looked up repeatedly (e.g. once per
+    `configure get` and for every templated setting), so the splits are cached.
+
+    Args:
+        path (str): Dot notation for the setting. E.g. settings.insilico.external.database.host
+
+    Returns:
+        Tuple[str, ...]: The elements of the path.
+    """
+    return tuple(path.split("."))
+
+
+def _invalidate_yaml_file_cache(file: Path):
+    """Drops any cached parses of a yaml file. Called after the file is written, since a write within the same
+    filesystem timestamp tick that leaves the size unchanged would not otherwise be detected.
+
+    Args:
+        file (Path): Path to the yaml file.
+    """
+    _yaml_file_cache.pop(file.absolute(), None)
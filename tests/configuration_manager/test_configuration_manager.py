@@ -17,7 +17,10 @@ from pathlib import Path
 import pytest
 
 # local libraries
-from appcli.configuration_manager import ConfigurationManager
+from appcli.configuration_manager import (
+    TEMPLATE_BYTECODE_CACHE_DIR_NAME,
+    ConfigurationManager,
+)
 from appcli.models.cli_context import CliContext
 from appcli.models.configuration import Configuration
 from appcli.orchestrators import DockerComposeOrchestrator
@@ -135,6 +138,78 @@ def test_apply_workflow(tmpdir):
     )
 
 
+def test_apply_caches_compiled_templates(tmpdir):
+    cli_context = create_cli_context(tmpdir)
+    conf_manager = create_conf_manager(tmpdir, cli_context)
+    conf_manager.initialise_configuration()
+
+    conf_manager.apply_configuration_changes(message="first apply")
+    bytecode_cache_dir = cli_context.get_configuration_metadata_dir().joinpath(
+        TEMPLATE_BYTECODE_CACHE_DIR_NAME
+    )
+    assert any(bytecode_cache_dir.iterdir())
+
+    # Applying again renders from the cached templates
+    conf_manager.apply_configuration_changes(message="second apply")
+    generated_configuration_dir = cli_context.get_generated_configuration_dir()
+    assert generated_file_matches_expected(
+        generated_configuration_dir, "nesting/nested_baseline_file.py"
+    )
+
+
+def test_apply_skips_backup_of_unchanged_generated_configuration(tmpdir):
+    cli_context = create_cli_context(tmpdir)
+    conf_manager = create_conf_manager(tmpdir, cli_context)
+    conf_manager.initialise_configuration()
+    backup_dir = Path(tmpdir, "conf/.generated-archive")
+
+    # Nothing to backup on the first apply, then the first generated configuration is backed up
+    conf_manager.apply_configuration_changes(message="first apply")
+    conf_manager.apply_configuration_changes(message="second apply")
+    assert len(list(backup_dir.glob("*.tgz"))) == 1
+
+    last_backup_record_file = backup_dir / ".generated-last-backup.json"
+    first_backup_record = last_backup_record_file.read_text()
+
+    # The generated configuration is unchanged, so it is not backed up again
+    conf_manager.apply_configuration_changes(message="third apply")
+    assert len(list(backup_dir.glob("*.tgz"))) == 1
+    assert last_backup_record_file.read_text() == first_backup_record
+
+    # Changes to the generated configuration are backed up
+    conf_manager.set_variable("test.identity.password", "securepassword1")
+    conf_manager.apply_configuration_changes(message="fourth apply")
+    conf_manager.apply_configuration_changes(message="fifth apply")
+    assert last_backup_record_file.read_text() != first_backup_record
+
+
+def test_apply_backs_up_generated_configuration_with_symlinks(tmpdir):
+    cli_context = create_cli_context(tmpdir)
+    conf_manager = create_conf_manager(tmpdir, cli_context)
+    conf_manager.initialise_configuration()
+    backup_dir = Path(tmpdir, "conf/.generated-archive")
+    last_backup_record_file = backup_dir / ".generated-last-backup.json"
+
+    conf_manager.apply_configuration_changes(message="first apply")
+    conf_manager.apply_configuration_changes(message="second apply")
+    first_backup_record = last_backup_record_file.read_text()
+
+    # A dangling symlink is archived as a link rather than read, and its addition is backed up
+    generated_configuration_dir = cli_context.get_generated_configuration_dir()
+    Path(generated_configuration_dir, "dangling-link").symlink_to("does-not-exist")
+    conf_manager.apply_configuration_changes(message="third apply")
+    symlink_backup_record = last_backup_record_file.read_text()
+    assert symlink_backup_record != first_backup_record
+
+    # Changing only a file's mode is backed up
+    generated_file = Path(
+        generated_configuration_dir, "nesting/nested_baseline_file.py"
+    )
+    generated_file.chmod(0o600)
+    conf_manager.apply_configuration_changes(message="fourth apply")
+    assert last_backup_record_file.read_text() != symlink_backup_record
+
+
 def generated_file_matches_expected(generated_configuration_dir, filepath: str):
     return filecmp.cmp(
         Path(generated_configuration_dir, filepath), Path(EXPECTED_DIR, filepath)
@@ -9,12 +9,20 @@ Created by brightSPARK Labs
 www.brightsparklabs.com
 """
 
+# standard libraries
+import json
+import os
+
 # vendor libraries
 import pytest
 
 # local libraries
 from appcli.commands.appcli_command import AppcliCommand
+from appcli.configuration import configuration_dir_state
 from appcli.configuration.configuration_dir_state import (
+    CLEAN_CONFIGURATION_DIR_STATE,
+    STATE_CACHE_FILE_NAME,
+    UNAPPLIED_CONFIGURATION_DIR_STATE,
     CleanConfigurationDirState,
     ConfigurationDirState,
     ConfigurationDirStateFactory,
@@ -23,6 +31,11 @@ from appcli.configuration.configuration_dir_state import (
     DirtyGenConfigurationDirState,
     NoDirectoryProvidedConfigurationDirState,
     UnappliedConfigurationDirState,
+    UninitialisedConfigurationDirState,
+)
+from appcli.git_repositories.git_repositories import (
+    ConfigurationGitRepository,
+    GeneratedConfigurationGitRepository,
 )
 
 # ------------------------------------------------------------------------------
@@ -67,5 +80,131 @@ def test_no_configure_init_on_existing_repos():
         assert pytest_wrapped_e.value.code == 1
 
 
+def test_uninitialised_state_for_non_git_configuration_dir(tmp_path):
+    """A configuration dir which isn't a git repository is uninitialised."""
+    configuration_dir = tmp_path / "conf"
+    configuration_dir.mkdir()
+    backup_dir = tmp_path / "backup"
+    backup_dir.mkdir()
+
+    state = ConfigurationDirStateFactory.get_state(
+        configuration_dir, configuration_dir / ".generated", "1.0.0", backup_dir
+    )
+    assert isinstance(state, UninitialisedConfigurationDirState)
+
+
+def test_uninitialised_state_for_empty_git_dir(tmp_path):
+    """A configuration dir with an empty '.git' directory is uninitialised, and is left untouched."""
+    configuration_dir = tmp_path / "conf"
+    configuration_dir.joinpath(".git").mkdir(parents=True)
+    configuration_dir.joinpath("settings.yml").write_text("key: value\n")
+    backup_dir = tmp_path / "backup"
+    backup_dir.mkdir()
+
+    state = ConfigurationDirStateFactory.get_state(
+        configuration_dir, configuration_dir / ".generated", "1.0.0", backup_dir
+    )
+    assert isinstance(state, UninitialisedConfigurationDirState)
+    assert not any(configuration_dir.joinpath(".git").iterdir())
+    assert sorted(p.name for p in configuration_dir.iterdir()) == [
+        ".git",
+        "settings.yml",
+    ]
+
+
+def test_stateless_states_are_shared():
+    """States without an error message are the same instance across calls."""
+    first = ConfigurationDirStateFactory.get_state(None, None, "1.0.0", None)
+    second = ConfigurationDirStateFactory.get_state(None, None, "1.0.0", None)
+    assert first is second
+
+
+def test_disallowed_unless_forced_commands():
+    """Commands which are disallowed unless forced only run when forced."""
+    state = DirtyGenConfigurationDirState()
+
+    state.verify_command_allowed(AppcliCommand.CONFIGURE_APPLY, force=True)
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        state.verify_command_allowed(AppcliCommand.CONFIGURE_APPLY)
+    assert pytest_wrapped_e.value.code == 1
+
+    # Forcing has no effect on commands which are outright disallowed.
+    with pytest.raises(SystemExit):
+        state.verify_command_allowed(AppcliCommand.MIGRATE, force=True)
+
+
+def test_state_cache_is_invalidated_by_changes(tmp_path, monkeypatch):
+    """The cached state is used until a file in the configuration directory changes."""
+    configuration_dir = tmp_path / "conf"
+    generated_configuration_dir = configuration_dir / ".generated"
+    metadata_dir = configuration_dir / ".metadata"
+    backup_dir = tmp_path / "backup"
+    backup_dir.mkdir()
+    config_repo = ConfigurationGitRepository(configuration_dir)
+    config_repo.rename_current_branch(config_repo.generate_branch_name("1.0.0"))
+    generated_config_repo = GeneratedConfigurationGitRepository(
+        generated_configuration_dir
+    )
+
+    # Files changed within the racy window are never cached. Change times cannot be backdated, so no window is
+    # allowed while testing how the cache is invalidated.
+    monkeypatch.setattr(configuration_dir_state, "STATE_CACHE_RACY_WINDOW_NS", 0)
+
+    def settle_files():
+        # Backdate the files so that a restored modification time is distinguishable from a fresh one.
+        for path in [tmp_path, *tmp_path.rglob("*")]:
+            os.utime(path, (1_600_000_000, 1_600_000_000))
+        # Git rewrites its index to refresh the changed stat data, so let it do that now rather than while getting the
+        # state. Then date the index after the files so that its entries are not 'racily clean'.
+        for repo in (config_repo, generated_config_repo):
+            repo.repo.git.status()
+        for index_file in tmp_path.rglob(".git/index"):
+            os.utime(index_file, (1_600_000_100, 1_600_000_100))
+
+    def get_state():
+        return ConfigurationDirStateFactory.get_state(
+            configuration_dir,
+            generated_configuration_dir,
+            "1.0.0",
+            backup_dir,
+            metadata_dir,
+        )
+
+    settle_files()
+    assert get_state() is CLEAN_CONFIGURATION_DIR_STATE
+    cache_file = metadata_dir / STATE_CACHE_FILE_NAME
+    assert cache_file.is_file()
+
+    # Unchanged directories are served from the cache.
+    cache = json.loads(cache_file.read_text())
+    cache["state"] = UnappliedConfigurationDirState.__name__
+    cache_file.write_text(json.dumps(cache))
+    assert get_state() is UNAPPLIED_CONFIGURATION_DIR_STATE
+
+    # Modifying a tracked file invalidates the cache.
+    configuration_dir.joinpath(".gitignore").write_text("modified\n")
+    settle_files()
+    assert isinstance(get_state(), DirtyConfConfigurationDirState)
+
+    # An edit which keeps the size and restores the modification time (e.g. `cp -p`) also invalidates the cache.
+    config_repo.commit_changes("Modified .gitignore")
+    settle_files()
+    assert get_state() is CLEAN_CONFIGURATION_DIR_STATE
+    gitignore = configuration_dir.joinpath(".gitignore")
+    original_stat = gitignore.stat()
+    gitignore.write_text("modifier\n")
+    os.utime(gitignore, ns=(original_stat.st_atime_ns, original_stat.st_mtime_ns))
+    assert gitignore.stat().st_size == original_stat.st_size
+    assert isinstance(get_state(), DirtyConfConfigurationDirState)
+
+    # A file changed within the racy window is not cached, even if its modification time was restored.
+    monkeypatch.undo()
+    cache_file.unlink()
+    gitignore.write_text("modified\n")
+    os.utime(gitignore, ns=(original_stat.st_atime_ns, original_stat.st_mtime_ns))
+    get_state()
+    assert not cache_file.exists()
+
+
 # TODO: More ConfigurationDirStateFactory tests
 # TODO: Test the more states and the desired outcomes from running commands
@@ -91,6 +91,40 @@ def test_branch_name_as_expected_empty_version(monkeypatch, tmpdir):
     assert f"{BRANCH_NAME_PREFIX}" == branch_name
 
 
+def test_can_get_version_from_repository_branch(tmp_path):
+    git_repo = GitRepository(tmp_path)
+    git_repo.rename_current_branch(git_repo.generate_branch_name("1.0"))
+
+    assert "1.0" == git_repo.get_repository_version()
+
+
+def test_has_multiple_commits(tmp_path):
+    git_repo = GitRepository(tmp_path)
+    assert not git_repo.has_multiple_commits()
+
+    tmp_path.joinpath("file.txt").write_text("contents")
+    git_repo.commit_changes("Second commit")
+    assert git_repo.has_multiple_commits()
+
+
+def test_does_branch_exist(tmp_path):
+    git_repo = GitRepository(tmp_path)
+    branch_name = git_repo.generate_branch_name("1.0")
+    assert git_repo.does_branch_exist("master")
+    assert not git_repo.does_branch_exist(branch_name)
+    # Names of list attributes are not branches.
+    assert not git_repo.does_branch_exist("index")
+
+    git_repo.checkout_new_branch_from_master(branch_name)
+    assert git_repo.does_branch_exist(branch_name)
+
+
+def test_get_current_commit_hash(tmp_path):
+    git_repo = GitRepository(tmp_path)
+
+    assert git_repo.get_current_commit_hash() == git_repo.repo.git.rev_parse("HEAD")
+
+
 # ------------------------------------------------------------------------------
 # FIXTURES
 # ------------------------------------------------------------------------------
@@ -11,6 +11,7 @@ www.brightsparklabs.com
 
 # standard libraries
 import filecmp
+import os
 from pathlib import Path
 
 # vendor libraries
@@ -19,6 +20,7 @@ from deepdiff import DeepDiff
 from ruamel import yaml
 
 # local libraries
+from appcli import variables_manager
 from appcli.variables_manager import VariablesManager
 
 # ------------------------------------------------------------------------------
@@ -286,6 +288,76 @@ def test_set_all_variables(tmpdir):
     assert filecmp.cmp(set_config_file, compare_file)
 
 
+def test_set_nested_variable(tmpdir):
+    """When we set a variable under a path which does not exist yet, we expect the parent elements to be created"""
+    set_config_file = Path(tmpdir, "test_app_set_nested_variable.yml")
+    set_config_file.touch()
+    var_manager = VariablesManager(set_config_file)
+    var_manager.set_variable("parent.child.string", "Value")
+    var_manager.set_variable("parent.other", 1)
+
+    assert var_manager.get_variable("parent.child.string") == "Value"
+    assert var_manager.get_all_variables() == {
+        "parent": {"child": {"string": "Value"}, "other": 1}
+    }
+
+
+def test_set_variable_preserves_comments(tmpdir):
+    """When we set a variable, we expect existing comments in our yml file to be kept"""
+    set_config_file = Path(tmpdir, "test_app_set_variable_preserves_comments.yml")
+    set_config_file.write_text("# Comment\nstring: Value # Inline comment\n")
+    var_manager = VariablesManager(set_config_file)
+    var_manager.set_variable("int", 1)
+
+    assert (
+        set_config_file.read_text()
+        == "# Comment\nstring: Value # Inline comment\nint: 1\n"
+    )
+
+
+def test_get_templating_configuration_keeps_merge_key_order_and_custom_tags(tmpdir):
+    """Templates iterate over the configuration, so it must load exactly as the file is written"""
+    config_file = Path(tmpdir, "settings.yml")
+    config_file.write_text(
+        "common: &c\n  A: 1\nsvc:\n  <<: *c\n  B: 2\ntagged: !foo value\n"
+    )
+    var_manager = VariablesManager(config_file)
+    settings = var_manager.get_templating_configuration()["settings"]
+
+    assert list(settings["svc"].items()) == [("B", 2), ("A", 1)]
+    assert settings["tagged"].value == "value"
+
+
+def test_get_variable_after_external_change(tmpdir, monkeypatch):
+    """When the yml file is changed outside of the variables manager, we expect the new value to be returned"""
+    config_file = Path(tmpdir, "test_app_external_change.yml")
+    config_file.write_text("string: Value\n")
+    var_manager = VariablesManager(config_file)
+    assert var_manager.get_variable("string") == "Value"
+
+    # Modifying the returned data must not affect later reads.
+    var_manager.get_all_variables()["string"] = "Modified"
+    assert var_manager.get_variable("string") == "Value"
+
+    config_file.write_text("string: Changed value\n")
+    assert var_manager.get_variable("string") == "Changed value"
+
+    # A file changed within the racy window is not cached, even if its mtime was restored.
+    config_file.write_text("string: Value\n")
+    os.utime(config_file, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+    assert var_manager.get_variable("string") == "Value"
+    assert config_file.absolute() not in variables_manager._yaml_file_cache
+
+    # A same-size rewrite which restores the mtime must still be detected once the file has been cached. Change
+    # times cannot be backdated, so no racy window is allowed for this.
+    monkeypatch.setattr(variables_manager, "YAML_FILE_CACHE_RACY_WINDOW_NS", 0)
+    assert var_manager.get_variable("string") == "Value"
+    assert config_file.absolute() in variables_manager._yaml_file_cache
+    config_file.write_text("string: Other\n")
+    os.utime(config_file, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+    assert var_manager.get_variable("string") == "Other"
+
+
 # ------------------------------------------------------------------------------
 # FIXTURES
 # ------------------------------------------------------------------------------